@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Benchmark of connect-per-call against the connection pool
+"""
+
+import sys
+import time
+
+get_db = __import__('filtered_logger').get_db
+pooled_db = __import__('filtered_logger').pooled_db
+
+
+def short_query(connection) -> None:
+    """ runs one short query on connection
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1")
+    cursor.fetchall()
+    cursor.close()
+
+
+def connect_per_call(count: int) -> None:
+    """ opens a new connection for every query
+    """
+    for _ in range(count):
+        connection = get_db()
+        short_query(connection)
+        connection.close()
+
+
+def pooled(count: int) -> None:
+    """ borrows a pooled connection for every query
+    """
+    for _ in range(count):
+        with pooled_db() as connection:
+            short_query(connection)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, run in (("connect per call", connect_per_call),
+                      ("pool", pooled)):
+        start = time.perf_counter()
+        run(count)
+        elapsed = time.perf_counter() - start
+        print("{}: {} queries in {:.2f}s ({:.0f} queries/sec)".format(
+            name, count, elapsed, count / elapsed))
@@ -2,13 +2,59 @@
 """  5. Encrypting passwords
 """
 
+import asyncio
 import bcrypt
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_ROUNDS = 12
+
+
+def bcrypt_rounds() -> int:
+    """ returns the bcrypt cost policy, read from BCRYPT_ROUNDS
+    """
+    try:
+        return int(os.getenv("BCRYPT_ROUNDS", DEFAULT_ROUNDS))
+    except ValueError:
+        return DEFAULT_ROUNDS
+
+
+def calibrate_rounds(target_seconds: float = 0.25, min_rounds: int = 10,
+                     max_rounds: int = 16) -> int:
+    """ returns the highest cost whose verify time on this hardware
+        stays within target_seconds
+    """
+    salt = bcrypt.gensalt(min_rounds)
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", salt)
+    elapsed = time.perf_counter() - start
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """ returns the cost factor a bcrypt hash was made with
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode()
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """ tells whether a hash was made with a cost other than the policy
+    """
+    return hash_cost(hashed_password) != bcrypt_rounds()
 
 
 def hash_password(password: str) -> bytes:
     """ returns a salted, hashed password, which is a byte string
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(bcrypt_rounds())
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed
 
@@ -17,3 +63,65 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     """ validates that the provided password matches the hashed password
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def verify_and_rehash(hashed_password: bytes,
+                      password: str) -> Tuple[bool, Optional[bytes]]:
+    """ validates password and, when it matches a hash made with another
+        cost than the policy, also returns a fresh hash to store
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+class PasswordHasher:
+    """ bcrypt service running hashes on a thread pool
+
+        bcrypt releases the GIL while hashing, so batches and concurrent
+        logins use every core instead of serializing on one thread.
+    """
+
+    def __init__(self, max_workers: int = None):
+        """ Initialization
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="bcrypt")
+
+    def hash_many(self, passwords: Iterable[str]) -> List[bytes]:
+        """ returns the hashes of passwords, in order
+        """
+        return list(self._executor.map(hash_password, passwords))
+
+    def verify_many(self,
+                    pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+        """ returns, in order, whether each (hashed_password, password)
+            pair matches
+        """
+        return list(self._executor.map(lambda pair: is_valid(*pair), pairs))
+
+    async def hash(self, password: str) -> bytes:
+        """ hashes password without blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          hash_password, password)
+
+    async def verify(self, hashed_password: bytes, password: str) -> bool:
+        """ validates password without blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, is_valid,
+                                          hashed_password, password)
+
+    def shutdown(self) -> None:
+        """ waits for pending work and stops the threads
+        """
+        self._executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    target_ms = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+    print("BCRYPT_ROUNDS={}".format(calibrate_rounds(target_ms / 1000)))
@@ -2,14 +2,28 @@
 """ 0. Regex-ing
 """
 
+import atexit
+import copy
 import logging
+import logging.handlers
 import mysql.connector
+import mysql.connector.pooling
 import os
+import queue
 import re
-from typing import List
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Sequence
 from mysql.connector import Error
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+ROW_COLUMNS = ("name", "email", "phone", "ssn", "password",
+               "ip", "last_login", "user_agent")
+ROW_FORMAT = "name={}; email={}; phone={}; ssn={}; password={}; " \
+             "ip={}; last_login={}; user_agent={}; "
 
 
 class RedactingFormatter(logging.Formatter):
@@ -25,45 +39,253 @@ class RedactingFormatter(logging.Formatter):
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = Redactor(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """ format method
         """
         message = super().format(record)
-        return filter_datum(self.fields, self.REDACTION,
-                            message, self.SEPARATOR)
+        return self.redactor.redact(message)
+
+
+class Redactor:
+    """ Redacts PII fields from `key=value` messages in a single pass
+
+        The field list is compiled once into one alternation regex, so
+        redacting a message costs one linear scan whatever the number
+        of fields.
+    """
+
+    def __init__(self, fields: Sequence[str], redaction: str = "***",
+                 separator: str = ";"):
+        """ Initialization
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = None
+        self._masks = {}
+        if self.fields:
+            sep = re.escape(separator)
+            alternation = "|".join(re.escape(f) for f in self.fields)
+            self._pattern = re.compile(
+                r"(?:^|(?<={sep}))({alt})(?:(?!{sep}).)*".format(
+                    sep=sep, alt=alternation), re.DOTALL)
+
+    def _substitute(self, match: re.Match) -> str:
+        """ replacement for one matched segment
+        """
+        return match.group(1) + "=" + self.redaction
+
+    def redact(self, message: str) -> str:
+        """ returns the message with every PII segment obfuscated
+        """
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self._substitute, message)
+
+    def mask(self, columns: Sequence[str]) -> tuple:
+        """ returns, for each column, whether it holds a PII field
+        """
+        columns = tuple(columns)
+        mask = self._masks.get(columns)
+        if mask is None:
+            mask = tuple(column in self.fields for column in columns)
+            self._masks[columns] = mask
+        return mask
+
+    def redact_row(self, row: Sequence, columns: Sequence[str]) -> tuple:
+        """ returns the row with its PII columns replaced by the redaction
+        """
+        return tuple(self.redaction if pii else value
+                     for value, pii in zip(row, self.mask(columns)))
+
+    def serialize_row(self, row: Sequence, columns: Sequence[str]) -> str:
+        """ returns the redacted row in the `key=value<separator>` format,
+            without building and re-parsing the clear text message
+        """
+        redaction = self.redaction
+        separator = self.separator
+        return "".join(
+            "{}={}{}".format(column, redaction if pii else value, separator)
+            for column, value, pii in zip(columns, row, self.mask(columns)))
+
+
+@lru_cache(maxsize=32)
+def _get_redactor(fields: tuple, redaction: str,
+                  separator: str) -> Redactor:
+    """ returns a cached Redactor for the given configuration
+    """
+    return Redactor(fields, redaction, separator)
 
 
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """ filter_datum that returns the log message obfuscated"""
-    value = message.split(separator)
+    return _get_redactor(tuple(fields), redaction,
+                         separator).redact(message)
+
 
-    for field in fields:
-        for i in range(len(value)):
-            if value[i].startswith(field):
-                subst = field + '=' + redaction
-                value[i] = re.sub(value[i], '', value[i])
-                value[i] = subst
-    return separator.join(value)
+_EXC_FORMATTER = logging.Formatter()
 
 
-def get_logger() -> logging.Logger:
+class _CountingListener(logging.handlers.QueueListener):
+    """ QueueListener that counts the records it hands to its handlers
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Initialization
+        """
+        super().__init__(*args, **kwargs)
+        self.emitted = 0
+
+    def handle(self, record: logging.LogRecord) -> None:
+        """ handle method, runs on the listener thread
+        """
+        super().handle(record)
+        self.emitted += 1
+
+    def enqueue_sentinel(self) -> None:
+        """ waits for room in a full queue instead of raising
+        """
+        self.queue.put(self._sentinel)
+
+
+class AsyncRedactingHandler(logging.handlers.QueueHandler):
+    """ Queue-backed handler: redaction and I/O of `handler` run on a
+        background thread, the caller only pays for an enqueue
+
+        `overflow` decides what happens when the bounded queue is full:
+          - "block": wait for room (no record is lost)
+          - "drop_oldest": discard the oldest queued record
+          - "sample": once the queue is half full, keep only one record
+            in `sample_rate`; drop the record when the queue is full
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop_oldest", "sample")
+
+    def __init__(self, handler: logging.Handler, maxsize: int = 10000,
+                 overflow: str = "block", sample_rate: int = 10):
+        """ Initialization
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(overflow))
+        super().__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.sample_rate = max(1, sample_rate)
+        self.dropped = 0
+        self._seen = 0
+        self._lock = threading.Lock()
+        self.listener = _CountingListener(self.queue, handler,
+                                          respect_handler_level=True)
+
+    @property
+    def emitted(self) -> int:
+        """ number of records written by the background thread
+        """
+        return self.listener.emitted
+
+    def start(self) -> None:
+        """ starts the background thread
+        """
+        self.listener.start()
+
+    def stop(self) -> None:
+        """ flushes the queue and stops the background thread
+        """
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ returns a copy of record safe to hand to another thread
+
+            The message is merged with its args and the traceback turned
+            into exc_text here, so mutable args and exc_info don't
+            outlive the call; formatting and redaction still happen on
+            the listener.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _EXC_FORMATTER.formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _drop(self) -> None:
+        """ counts one dropped record
+        """
+        with self._lock:
+            self.dropped += 1
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ enqueue method applying the overflow policy
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        if self.overflow == "sample" and \
+                self.queue.qsize() * 2 >= self.queue.maxsize:
+            with self._lock:
+                self._seen += 1
+                keep = self._seen % self.sample_rate == 0
+            if not keep:
+                self._drop()
+                return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                if self.overflow == "sample":
+                    self._drop()
+                    return
+            try:
+                self.queue.get_nowait()
+                self._drop()
+            except queue.Empty:
+                pass
+
+
+def get_logger(async_mode: bool = None) -> logging.Logger:
     """ returns a logging.Logger object
+
+        With async_mode (or PERSONAL_DATA_LOG_ASYNC=1) records are
+        redacted and written by an AsyncRedactingHandler, sized by
+        PERSONAL_DATA_LOG_QUEUE_SIZE and PERSONAL_DATA_LOG_OVERFLOW.
     """
+    if async_mode is None:
+        async_mode = os.getenv("PERSONAL_DATA_LOG_ASYNC", "0") == "1"
     user_data_logger = logging.getLogger("user_data")
     user_data_logger.setLevel(logging.INFO)
     user_data_logger.propagate = False
     formatter = RedactingFormatter(PII_FIELDS)
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    user_data_logger.addHandler(stream_handler)
+    if not async_mode:
+        user_data_logger.addHandler(stream_handler)
+        return user_data_logger
+
+    async_handler = AsyncRedactingHandler(
+        stream_handler,
+        maxsize=int(os.getenv("PERSONAL_DATA_LOG_QUEUE_SIZE", "10000")),
+        overflow=os.getenv("PERSONAL_DATA_LOG_OVERFLOW", "block"),
+        sample_rate=int(os.getenv("PERSONAL_DATA_LOG_SAMPLE_RATE", "10")))
+    async_handler.start()
+    atexit.register(async_handler.stop)
+    user_data_logger.addHandler(async_handler)
 
     return user_data_logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
-    """ returns a connector to the database
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def _db_config() -> dict:
+    """ returns the connection settings from the environment
     """
     username = os.getenv("PERSONAL_DATA_DB_USERNAME", "root")
     password = os.getenv("PERSONAL_DATA_DB_PASSWORD", "")
@@ -74,29 +296,91 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
         raise ValueError(
             "PERSONAL_DATA_DB_NAME environment variable is not set")
 
-    return mysql.connector.connect(user=username,
-                                   password=password,
-                                   host=host,
-                                   database=db_name)
+    return {"user": username, "password": password,
+            "host": host, "database": db_name}
+
+
+def get_db() -> mysql.connector.connection.MySQLConnection:
+    """ returns a connector to the database
+    """
+    return mysql.connector.connect(**_db_config())
+
+
+def get_db_pool() -> mysql.connector.pooling.MySQLConnectionPool:
+    """ returns the process-wide connection pool, created on first use
+        with PERSONAL_DATA_DB_POOL_SIZE connections (default 5)
+    """
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                pool_size = int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE", "5"))
+                _db_pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name="personal_data", pool_size=pool_size,
+                    **_db_config())
+    return _db_pool
+
+
+@contextmanager
+def pooled_db() -> Iterator[mysql.connector.connection.MySQLConnection]:
+    """ yields a pooled connection and gives it back to the pool on exit
+    """
+    connection = get_db_pool().get_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def fetch_rows(cursor, batch_size: int = 1000) -> Iterator[tuple]:
+    """ yields rows from an executed cursor, batch_size at a time
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def serialize_rows(rows: Iterable[tuple], columns: Sequence[str],
+                   redactor: "Redactor") -> Iterator[str]:
+    """ yields the redacted log message of each row, masking PII columns
+        by position
+    """
+    for row in rows:
+        yield redactor.serialize_row(row, columns)
+
+
+def peak_rss_kb() -> int:
+    """ returns the peak resident set size of the process in KiB
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
 
 def main():
     """ Main function
+
+        Rows are streamed from an unbuffered (server-side) cursor, so
+        memory stays flat however big the users table is.
     """
     logger = get_logger()
+    redactor = Redactor(PII_FIELDS, '***', '; ')
+    batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", "1000"))
     try:
         db_connection = get_db()
-        cursor = db_connection.cursor()
+        cursor = db_connection.cursor(buffered=False)
         cursor.execute("SELECT * FROM users")
-        rows = cursor.fetchall()
-        for row in rows:
-            msg = "name={}; email={}; phone={}; ssn={}; password={};\
-            ip={}; last_login={}; user_agent={}; ".format(
-                row[0], row[1], row[2], row[3], row[4], row[5], row[6],
-                row[7]
-                )
-            filtered_msg = filter_datum(list(PII_FIELDS), '***', msg, '; ')
-            logger.info(filtered_msg)
+        start = time.perf_counter()
+        count = 0
+        rows = fetch_rows(cursor, batch_size)
+        for message in serialize_rows(rows, ROW_COLUMNS, redactor):
+            logger.info(message)
+            count += 1
+        elapsed = time.perf_counter() - start
+        print("exported {} rows in {:.2f}s ({:.0f} rows/sec), "
+              "peak RSS {} KiB".format(
+                  count, elapsed, count / elapsed if elapsed else 0,
+                  peak_rss_kb()))
     except Error as e:
         logger.error("Error connecting to the database: %s", e)
     finally:
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" Bulk PII scrubbing of log files
+
+Usage: ./redact_logs.py INPUT OUTPUT [-w WORKERS] [-c CHUNK_SIZE]
+                        [-f FIELD ...] [-s SEPARATOR]
+"""
+
+import argparse
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+Redactor = __import__('filtered_logger').Redactor
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+
+_redactor = None
+
+
+def chunk_ranges(path: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """ yields (start, end) byte ranges of roughly chunk_size bytes,
+        each ending right after a newline (or at the end of the file)
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = mm.find(b'\n', end - 1)
+                end = size if newline == -1 else newline + 1
+            yield start, end
+            start = end
+
+
+def _init_worker(fields: List[str], separator: str) -> None:
+    """ builds the Redactor once per worker process
+    """
+    global _redactor
+    _redactor = Redactor(fields, "***", separator)
+
+
+def redact_range(path: str, start: int, end: int) -> bytes:
+    """ returns the redacted content of the [start, end) byte range
+    """
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8', 'surrogateescape')
+    lines = [_redactor.redact(line) for line in text.split('\n')]
+    return '\n'.join(lines).encode('utf-8', 'surrogateescape')
+
+
+def redact_file(src: str, dst: str, workers: int = None,
+                chunk_size: int = 4 << 20, fields: List[str] = PII_FIELDS,
+                separator: str = ";") -> None:
+    """ redacts src into dst using a pool of worker processes
+
+        At most two chunks per worker are in flight, and results are
+        written back in input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(list(fields), separator)) as pool, \
+            open(dst, 'wb') as out:
+        pending = deque()
+        for start, end in chunk_ranges(src, chunk_size):
+            pending.append(pool.submit(redact_range, src, start, end))
+            if len(pending) >= workers * 2:
+                out.write(pending.popleft().result())
+        while pending:
+            out.write(pending.popleft().result())
+
+
+def main():
+    """ Main function
+    """
+    parser = argparse.ArgumentParser(description="Redact PII from logs")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("-c", "--chunk-size", type=int, default=4 << 20)
+    parser.add_argument("-f", "--field", action="append", dest="fields")
+    parser.add_argument("-s", "--separator", default=";")
+    args = parser.parse_args()
+    redact_file(args.input, args.output, args.workers, args.chunk_size,
+                args.fields or PII_FIELDS, args.separator)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Benchmark of Redactor against the original filter_datum
+"""
+
+import re
+import sys
+import time
+from typing import List
+
+Redactor = __import__('filtered_logger').Redactor
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+ROW_COLUMNS = __import__('filtered_logger').ROW_COLUMNS
+ROW_FORMAT = __import__('filtered_logger').ROW_FORMAT
+
+
+def legacy_filter_datum(fields: List[str], redaction: str,
+                        message: str, separator: str) -> str:
+    """ filter_datum as it was before Redactor
+    """
+    value = message.split(separator)
+
+    for field in fields:
+        for i in range(len(value)):
+            if value[i].startswith(field):
+                subst = field + '=' + redaction
+                value[i] = re.sub(value[i], '', value[i])
+                value[i] = subst
+    return separator.join(value)
+
+
+def synthetic_lines(count: int) -> List[str]:
+    """ builds `count` log lines shaped like the users table rows
+    """
+    line = "name=user{0};email=user{0}@example.com;phone=555-{0:04d};" \
+           "ssn=000-00-{0:04d};password=pw{0};ip=10.0.{1}.{2};" \
+           "last_login=2019-11-14T06:16:24;user_agent=Mozilla/5.0;"
+    return [line.format(i % 10000, i % 256, i % 200) for i in range(count)]
+
+
+def synthetic_rows(count: int) -> List[tuple]:
+    """ builds `count` rows shaped like the users table
+    """
+    return [("user{}".format(i), "user{}@example.com".format(i),
+             "555-{:04d}".format(i % 10000), "000-00-{:04d}".format(i % 10000),
+             "pw{}".format(i), "10.0.{}.{}".format(i % 256, i % 200),
+             "2019-11-14T06:16:24", "Mozilla/5.0") for i in range(count)]
+
+
+def run(name: str, redact, lines: List[str]) -> None:
+    """ times redact over every line and prints msgs/sec
+    """
+    start = time.perf_counter()
+    for line in lines:
+        redact(line)
+    elapsed = time.perf_counter() - start
+    print("{}: {:.0f} msgs/sec".format(name, len(lines) / elapsed))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lines = synthetic_lines(count)
+    redactor = Redactor(PII_FIELDS, "***", ";")
+    run("filter_datum (legacy)",
+        lambda m: legacy_filter_datum(PII_FIELDS, "***", m, ";"), lines)
+    run("Redactor", redactor.redact, lines)
+
+    rows = synthetic_rows(count)
+    row_redactor = Redactor(PII_FIELDS, "***", "; ")
+    run("format + Redactor.redact",
+        lambda r: row_redactor.redact(ROW_FORMAT.format(*r)), rows)
+    run("Redactor.serialize_row",
+        lambda r: row_redactor.serialize_row(r, ROW_COLUMNS), rows)
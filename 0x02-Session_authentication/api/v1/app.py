@@ -3,6 +3,8 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.exclusions import ExclusionMatcher
+from api.v1.auth.registry import get_auth
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -36,30 +38,21 @@ def forbidden(error):
 
 
 def get_auth_instance():
-    """ get_auth_instance support method
+    """ get_auth_instance support method: the strategy registered for
+    AUTH_TYPE, if any, imported on demand
     """
     auth_type = getenv("AUTH_TYPE")
     if auth_type:
-        if auth_type == 'auth':
-            auth_module = __import__(f"api.v1.auth.{auth_type}",
-                                     fromlist=[f"{auth_type}"])
-            return auth_module.Auth()
-        elif auth_type == "basic_auth":
-            basic_auth_module = __import__(f"api.v1.auth.{auth_type}",
-                                           fromlist=[f"{auth_type}"])
-            return basic_auth_module.BasicAuth()
-        elif auth_type == 'session_auth':
-            session_auth_module = __import__(f"api.v1.auth.{auth_type}",
-                                             fromlist=[f"{auth_type}"])
-            return session_auth_module.SessionAuth()
-        elif auth_type == 'session_exp_auth':
-            session_auth_module = __import__(f"api.v1.auth.{auth_type}",
-                                             fromlist=[f"{auth_type}"])
-            return session_auth_module.SessionExpAuth()
+        return get_auth(auth_type)
     return None
 
 
 auth = get_auth_instance()
+excluded_paths = ExclusionMatcher(["/api/v1/status/",
+                                   "/api/v1/unauthorized/",
+                                   "/api/v1/forbidden/",
+                                   "/api/v1/auth_session/login/"
+                                   ])
 
 
 @app.before_request
@@ -69,12 +62,6 @@ def before_request():
     if auth is None:
         return
 
-    excluded_paths = ["/api/v1/status/",
-                      "/api/v1/unauthorized/",
-                      "/api/v1/forbidden/",
-                      "/api/v1/auth_session/login/"
-                      ]
-
     if not auth.require_auth(request.path, excluded_paths):
         return
 
@@ -82,10 +69,11 @@ def before_request():
     if auth_header is None and auth.session_cookie(request) is None:
         abort(401)
 
-    if not auth.current_user(request):
+    user = auth.request_user(request)
+    if not user:
         abort(403)
 
-    request.current_user = auth.current_user(request)
+    request.current_user = user
 
 
 if __name__ == "__main__":
@@ -2,31 +2,29 @@
 """ Module for Authorization
 """
 
-from flask import request
-from typing import List, TypeVar
-import fnmatch
+from api.v1.auth.exclusions import ExclusionMatcher, exclusion_matcher
+from flask import g, request
+from typing import List, TypeVar, Union
 import os
 
 
 class Auth:
     """ Auth class
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """ require_auth method
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExclusionMatcher]
+                     ) -> bool:
+        """ require_auth method: excluded_paths is a list of paths and
+        glob patterns, or an ExclusionMatcher built from one
         """
         if path is None:
             return True
         if excluded_paths is None or len(excluded_paths) == 0:
             return True
 
-        path = path.rstrip('/') + '/'
-
-        for excluded_path in excluded_paths:
-            excluded_path = excluded_path.rstrip('/') + '/'
-            if fnmatch.fnmatch(path, excluded_path):
-                return False
-
-        return True
+        if not isinstance(excluded_paths, ExclusionMatcher):
+            excluded_paths = exclusion_matcher(tuple(excluded_paths))
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """ authorization_header method
@@ -42,6 +40,14 @@ class Auth:
         """
         return None
 
+    def request_user(self, request=None) -> TypeVar('User'):
+        """ request_user method: current_user resolved once per request
+        and memoized on flask.g
+        """
+        if 'current_user' not in g:
+            g.current_user = self.current_user(request)
+        return g.current_user
+
     def session_cookie(self, request=None):
         """ session_cookie method
         """
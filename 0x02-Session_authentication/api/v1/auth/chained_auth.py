@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+""" Module for Chained Authorization
+"""
+
+from api.v1.auth.auth import Auth
+from typing import List, TypeVar
+
+
+class ChainedAuth(Auth):
+    """ Chained Authentication class: tries its strategies in order and
+    stops at the first one that authenticates the request
+    """
+    def __init__(self, strategies: List[Auth]):
+        """ Initialize the chain, cheapest strategy first
+        """
+        self.strategies = strategies
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """ current_user method
+        """
+        for strategy in self.strategies:
+            user = strategy.current_user(request)
+            if user:
+                return user
+        return None
+
+    def create_session(self, user_id: str = None) -> str:
+        """ create_session method: opens a session with the first
+        strategy holding sessions
+        """
+        for strategy in self.strategies:
+            if hasattr(strategy, "create_session"):
+                return strategy.create_session(user_id)
+        return None
+
+    def destroy_session(self, request=None):
+        """ destroy_session method: ends the session of the first
+        strategy holding sessions
+        """
+        for strategy in self.strategies:
+            if hasattr(strategy, "destroy_session"):
+                return strategy.destroy_session(request)
+        return False
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+""" Module of the route exclusion matcher
+"""
+from functools import lru_cache
+from typing import Iterable
+import fnmatch
+import re
+
+
+class ExclusionMatcher():
+    """ Matcher of the paths excluded from authentication
+
+    Built once: paths without wildcards go in a set, the glob patterns
+    are translated into one compiled alternation, so matching costs a
+    set lookup plus at most one regex match however many rules there
+    are. Paths and patterns are compared with a trailing slash, like
+    fnmatch did in Auth.require_auth.
+    """
+
+    def __init__(self, excluded_paths: Iterable[str] = ()):
+        """ Initialize the matcher from excluded paths and patterns
+        """
+        self.exact = set()
+        patterns = []
+        for excluded_path in excluded_paths:
+            excluded_path = excluded_path.rstrip('/') + '/'
+            if any(c in excluded_path for c in "*?["):
+                patterns.append(fnmatch.translate(excluded_path))
+            else:
+                self.exact.add(excluded_path)
+        self.patterns = len(patterns)
+        self.pattern = None
+        if patterns:
+            self.pattern = re.compile("|".join(
+                "(?:{})".format(p) for p in patterns))
+
+    def __len__(self) -> int:
+        """ Number of rules: exact paths plus glob patterns
+        """
+        return len(self.exact) + self.patterns
+
+    def match(self, path: str) -> bool:
+        """ Tell whether path is excluded
+        """
+        path = path.rstrip('/') + '/'
+        if path in self.exact:
+            return True
+        return self.pattern is not None and \
+            self.pattern.match(path) is not None
+
+
+@lru_cache(maxsize=32)
+def exclusion_matcher(excluded_paths: tuple) -> ExclusionMatcher:
+    """ Shared matcher of a tuple of excluded paths
+    """
+    return ExclusionMatcher(excluded_paths)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+""" Module of the authentication strategy registry
+"""
+from typing import TypeVar
+
+
+AUTH_TYPES = {
+    "auth": ("api.v1.auth.auth", "Auth"),
+    "basic_auth": ("api.v1.auth.basic_auth", "BasicAuth"),
+    "session_auth": ("api.v1.auth.session_auth", "SessionAuth"),
+    "session_exp_auth": ("api.v1.auth.session_exp_auth", "SessionExpAuth"),
+}
+AUTH_CHAINS = {
+    "chained": ("session_auth", "basic_auth"),
+}
+
+
+def auth_strategy(auth_type: str) -> TypeVar('Auth'):
+    """ Instance of one registered strategy, importing its module on
+    first use
+    """
+    if auth_type not in AUTH_TYPES:
+        raise ValueError("unknown AUTH_TYPE: {}".format(auth_type))
+    module_name, class_name = AUTH_TYPES[auth_type]
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)()
+
+
+def get_auth(auth_type: str) -> TypeVar('Auth'):
+    """ Auth instance for AUTH_TYPE: a registered strategy, a chain
+    name, or a comma separated list of strategies tried in order
+    """
+    names = AUTH_CHAINS.get(auth_type) or \
+        [name.strip() for name in auth_type.split(",") if name.strip()]
+    if len(names) == 1:
+        return auth_strategy(names[0])
+    from api.v1.auth.chained_auth import ChainedAuth
+    return ChainedAuth([auth_strategy(name) for name in names])
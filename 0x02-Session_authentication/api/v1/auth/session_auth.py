@@ -3,6 +3,7 @@
 """
 
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import ShardedSessionStore
 from uuid import uuid4
 from models.user import User
 
@@ -10,7 +11,7 @@ from models.user import User
 class SessionAuth(Auth):
     """ Session Authentication class
     """
-    user_id_by_session_id = {}
+    user_id_by_session_id = ShardedSessionStore()
 
     def create_session(self, user_id: str = None) -> str:
         """Creates a session ID for a user_id
@@ -65,9 +66,4 @@ class SessionAuth(Auth):
         if session_id is None:
             return False
 
-        user_id = self.user_id_by_session_id[session_id]
-        if user_id is None:
-            return False
-
-        del self.user_id_by_session_id[session_id]
-        return True
+        return self.user_id_by_session_id.pop(session_id) is not None
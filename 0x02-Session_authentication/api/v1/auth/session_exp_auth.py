@@ -2,14 +2,113 @@
 """ Module for Session Expiration Authorization
 """
 
+import heapq
+import itertools
 import os
+import threading
 from datetime import datetime, timedelta
 from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.session_store import SessionStore
+
+
+class SessionSweeper():
+    """ Background reclaimer of expired sessions
+
+    Expiration times go in a min-heap; a daemon thread wakes every
+    SESSION_SWEEP_INTERVAL seconds (default 1) and pops only the due
+    entries, so each sweep costs O(expired log n). Each entry keeps the
+    session dictionary it was scheduled for: sessions destroyed, evicted
+    or reclaimed meanwhile no longer map to it and are skipped.
+    """
+
+    def __init__(self, sessions: SessionStore, interval: float = None):
+        """ Initialize the sweeper of the sessions store
+        """
+        self.sessions = sessions
+        self.interval = interval if interval is not None else \
+            float(os.getenv("SESSION_SWEEP_INTERVAL", "1"))
+        self.reclaimed = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, session_id: str, session_dict: dict,
+                 expires_at: datetime):
+        """ Reclaim session_id once expires_at is past, if it still maps
+        to session_dict
+        """
+        with self._cond:
+            heapq.heappush(self._heap, (expires_at, next(self._seq),
+                                        session_id, session_dict))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="session-sweeper", daemon=True)
+                self._thread.start()
+
+    def reclaim(self, session_id: str, session_dict: dict):
+        """ Remove an expired session, unless it was replaced meanwhile
+        """
+        if self.sessions.peek(session_id) is not session_dict:
+            return
+        if self.sessions.pop(session_id) is None:
+            return
+        with self._cond:
+            self.reclaimed += 1
+
+    def sweep(self, now: datetime = None) -> int:
+        """ Reclaim the sessions expired at now; return how many
+        """
+        now = now or datetime.now()
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2:])
+        before = self.reclaimed
+        for session_id, session_dict in due:
+            self.reclaim(session_id, session_dict)
+        return self.reclaimed - before
+
+    def _run(self):
+        """ Sweeper thread
+        """
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+            self.sweep()
+
+    def _due(self, now: datetime) -> int:
+        """ Number of sessions due at now and still stored, visiting
+        only the due heap entries
+        """
+        count = 0
+        stack = [0] if self._heap else []
+        while stack:
+            i = stack.pop()
+            expires_at, _, session_id, session_dict = self._heap[i]
+            if expires_at <= now:
+                if self.sessions.peek(session_id) is session_dict:
+                    count += 1
+                stack.extend(j for j in (2 * i + 1, 2 * i + 2)
+                             if j < len(self._heap))
+        return count
+
+    def metrics(self) -> dict:
+        """ Live sessions, sessions expired but not reclaimed yet, and
+        sessions reclaimed so far
+        """
+        with self._cond:
+            expired = self._due(datetime.now())
+            return {"live": max(len(self.sessions) - expired, 0),
+                    "expired": expired,
+                    "reclaimed": self.reclaimed}
 
 
 class SessionExpAuth(SessionAuth):
     """ Session Expiration Authentication class
     """
+    sweeper = None
+
     def __init__(self):
         """ Initialize the session duration """
         session_duration = os.getenv('SESSION_DURATION', '0')
@@ -17,6 +116,9 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(session_duration)
         except ValueError:
             self.session_duration = 0
+        if SessionExpAuth.sweeper is None:
+            SessionExpAuth.sweeper = SessionSweeper(
+                self.user_id_by_session_id)
 
     def create_session(self, user_id=None):
         """ Create a session with expiration """
@@ -29,6 +131,10 @@ class SessionExpAuth(SessionAuth):
             "created_at": datetime.now()
         }
         self.user_id_by_session_id[session_id] = session_dict
+        if self.session_duration > 0:
+            self.sweeper.schedule(session_id, session_dict,
+                                  session_dict["created_at"] +
+                                  timedelta(seconds=self.session_duration))
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
@@ -49,6 +155,7 @@ class SessionExpAuth(SessionAuth):
 
         if created_at + timedelta(
                 seconds=self.session_duration) < datetime.now():
+            self.sweeper.reclaim(session_id, session_dict)
             return None
 
         return session_dict.get("user_id")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+""" Module of the session stores
+"""
+from collections import OrderedDict
+from os import getenv
+from typing import List
+import threading
+
+
+class SessionStore():
+    """ Session store interface: a mapping of session IDs to session
+    values (user IDs or session dictionaries)
+    """
+
+    def get(self, session_id: str, default=None):
+        """ Value of session_id, or default
+        """
+        raise NotImplementedError
+
+    def peek(self, session_id: str, default=None):
+        """ Value of session_id, or default, without counting it as a
+        use
+        """
+        return self.get(session_id, default)
+
+    def __setitem__(self, session_id: str, value):
+        """ Store value for session_id
+        """
+        raise NotImplementedError
+
+    def pop(self, session_id: str, default=None):
+        """ Remove session_id and return its value, or default
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """ Number of sessions
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, session_id: str):
+        """ Value of session_id, KeyError if it doesn't exist
+        """
+        value = self.get(session_id, KeyError)
+        if value is KeyError:
+            raise KeyError(session_id)
+        return value
+
+    def __delitem__(self, session_id: str):
+        """ Remove session_id, KeyError if it doesn't exist
+        """
+        if self.pop(session_id, KeyError) is KeyError:
+            raise KeyError(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        """ Whether session_id exists
+        """
+        return self.get(session_id, KeyError) is not KeyError
+
+
+class _Shard():
+    """ One shard of a ShardedSessionStore
+    """
+    __slots__ = ('lock', 'sessions', 'capacity', 'hits', 'misses',
+                 'evictions')
+
+    def __init__(self, capacity: int):
+        """ Initialize an empty shard holding up to capacity sessions
+        """
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class ShardedSessionStore(SessionStore):
+    """ In-memory session store split in shards, each an LRU ordered
+    dict behind its own lock, picked by the hash of the session ID
+
+    Threads only contend when their sessions fall in the same shard.
+    When a shard is full its least recently used session is evicted.
+    """
+
+    def __init__(self, shards: int = None, capacity: int = None):
+        """ Initialize the store with shards shards (SESSION_SHARDS,
+        default 16) and room for capacity sessions (SESSION_CAPACITY,
+        default 100000, 0 for no limit)
+        """
+        shards = shards or int(getenv("SESSION_SHARDS", "16"))
+        if capacity is None:
+            capacity = int(getenv("SESSION_CAPACITY", "100000"))
+        per_shard = -(-capacity // shards) if capacity > 0 else 0
+        self.shards = [_Shard(per_shard) for _ in range(shards)]
+
+    def _shard(self, session_id: str) -> _Shard:
+        """ Shard of session_id
+        """
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    def get(self, session_id: str, default=None):
+        """ Value of session_id, or default; marks it recently used
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            value = shard.sessions.get(session_id, KeyError)
+            if value is KeyError:
+                shard.misses += 1
+                return default
+            shard.sessions.move_to_end(session_id)
+            shard.hits += 1
+            return value
+
+    def peek(self, session_id: str, default=None):
+        """ Value of session_id, or default, leaving its recency and the
+        shard counters untouched
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            return shard.sessions.get(session_id, default)
+
+    def __setitem__(self, session_id: str, value):
+        """ Store value for session_id, evicting the least recently used
+        session of its shard when full
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.sessions[session_id] = value
+            shard.sessions.move_to_end(session_id)
+            while 0 < shard.capacity < len(shard.sessions):
+                shard.sessions.popitem(last=False)
+                shard.evictions += 1
+
+    def pop(self, session_id: str, default=None):
+        """ Remove session_id and return its value, or default
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            return shard.sessions.pop(session_id, default)
+
+    def __len__(self) -> int:
+        """ Number of sessions
+        """
+        return sum(len(shard.sessions) for shard in self.shards)
+
+    def __repr__(self) -> str:
+        """ Representation of a dict snapshot of all the sessions
+        """
+        snapshot = {}
+        for shard in self.shards:
+            with shard.lock:
+                snapshot.update(shard.sessions)
+        return repr(snapshot)
+
+    def stats(self) -> List[dict]:
+        """ Size, capacity, hits, misses and evictions of each shard
+        """
+        result = []
+        for shard in self.shards:
+            with shard.lock:
+                result.append({"size": len(shard.sessions),
+                               "capacity": shard.capacity,
+                               "hits": shard.hits,
+                               "misses": shard.misses,
+                               "evictions": shard.evictions})
+        return result
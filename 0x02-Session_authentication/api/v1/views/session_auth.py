@@ -28,9 +28,11 @@ def auth_session():
     if not user.is_valid_password(user_pwd):
         return jsonify({"error": "wrong password"}), 401
 
-    from api.v1.auth.session_auth import SessionAuth
-
-    session_auth = SessionAuth()
+    from api.v1.app import auth
+    session_auth = auth
+    if not hasattr(session_auth, "create_session"):
+        from api.v1.auth.session_auth import SessionAuth
+        session_auth = SessionAuth()
     session_id = session_auth.create_session(user.id)
     if session_id is None:
         return jsonify({"error": "unable to create session"}), 500
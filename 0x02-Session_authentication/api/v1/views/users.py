@@ -2,18 +2,140 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, g, json, jsonify, request
+from flask import after_this_request, stream_with_context
 from models.user import User
+from typing import List
+from urllib.parse import quote, urlencode
+import zlib
+
+PAGE_SIZE = 100
+FILTERS = ('id', 'email', 'first_name', 'last_name')
+SORTS = FILTERS + ('created_at', 'updated_at')
+
+
+def not_modified(etag: str) -> Response:
+    """ 304 response if the request's If-None-Match matches etag, else
+    None; the response sent instead gets etag once it succeeds
+    """
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    @after_this_request
+    def set_etag(response):
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+    return None
+
+
+def next_link(users: List[User], limit: int) -> str:
+    """ `Link: rel="next"` header value of a full page of users ordered
+    by ID, keeping the other query parameters
+    """
+    args = request.args.to_dict()
+    args['limit'] = limit
+    args['after'] = users[-1].id
+    return '<{}?{}>; rel="next"'.format(
+        request.base_url, urlencode(args, quote_via=quote))
+
+
+def stream_users(limit: int = None, after: str = None):
+    """ Generator of the JSON array of users, PAGE_SIZE users at a time
+    """
+    yield "["
+    sent = 0
+    while limit is None or sent < limit:
+        size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - sent)
+        users = User.page(size, after)
+        for user in users:
+            yield ("," if sent > 0 else "") + json.dumps(user.to_json())
+            sent += 1
+        if len(users) < size:
+            break
+        after = users[-1].id
+    yield "]"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users to return
+      - after: ID of the last user of the previous page
+      - stream: 1 to stream the JSON array in chunks
+      - id, email, first_name, last_name: exact match, or prefix match
+        when the value ends with `*`
+      - sort: field to sort by, `-` prefixed for descending; `after`
+        only goes with sort=id
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, ordered by ID when
+        paginated, with a `Link: rel="next"` header if more may follow;
+        filtered or sorted lists carry the storage plan in `X-Query-Plan`;
+        the ETag follows the collection version and the query
+      - 304 if If-None-Match has the current ETag
+      - 400 if limit isn't a positive integer, sort isn't a field, or
+        after is given with another sort than id
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+    response = not_modified("{}-{:x}".format(
+        User.version(), zlib.crc32(request.query_string)))
+    if response is not None:
+        return response
+    filters = {}
+    prefixes = {}
+    for field in FILTERS:
+        value = request.args.get(field)
+        if value is None:
+            continue
+        if value.endswith('*'):
+            prefixes[field] = value[:-1]
+        else:
+            filters[field] = value
+    sort = request.args.get('sort')
+    if sort is not None and sort.lstrip('-') not in SORTS:
+        return jsonify({'error': "sort must be one of {}"
+                        .format(", ".join(SORTS))}), 400
+    if after is not None and sort not in (None, 'id'):
+        return jsonify({'error': "after can only be used with sort=id"}), 400
+    if filters or prefixes or sort:
+        paged = limit is not None or after is not None
+        if paged and sort is None:
+            sort = 'id'
+        users, plan = User.query(filters, prefixes, sort)
+        if after is not None:
+            users = [user for user in users if user.id > after]
+        if paged:
+            limit = limit or PAGE_SIZE
+            users = users[:limit]
+        response = jsonify([user.to_json() for user in users])
+        response.headers['X-Query-Plan'] = plan
+        if paged and sort == 'id' and len(users) == limit:
+            response.headers['Link'] = next_link(users, limit)
+        return response
+    if request.args.get('stream') == '1':
+        return Response(stream_with_context(stream_users(limit, after)),
+                        mimetype='application/json')
+    if limit is None and after is None:
+        all_users = [user.to_json() for user in User.all()]
+        return jsonify(all_users)
+
+    limit = limit or PAGE_SIZE
+    users = User.page(limit, after)
+    response = jsonify([user.to_json() for user in users])
+    if len(users) == limit:
+        response.headers['Link'] = next_link(users, limit)
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -22,7 +144,8 @@ def view_one_user(user_id: str = None) -> str:
     Path parameter:
       - User ID
     Return:
-      - User object JSON represented
+      - User object JSON represented, with an ETag
+      - 304 if If-None-Match has the current ETag
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -30,6 +153,9 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
+    response = not_modified(user.etag())
+    if response is not None:
+        return response
     return jsonify(user.to_json())
 
 
@@ -107,10 +233,11 @@ def update_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    if user_id == 'me' and request.current_user is None:
+    current_user = g.get('current_user')
+    if user_id == 'me' and current_user is None:
         abort(404)
-    if user_id == 'me' and request.current_user is not None:
-        user = request.current_user
+    if user_id == 'me' and current_user is not None:
+        user = current_user
     else:
         user = User.get(user_id)
         if user is None:
@@ -127,7 +254,10 @@ def update_user(user_id: str = None) -> str:
         user.first_name = rj.get('first_name')
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
-    user.save()
+    try:
+        user.save()
+    except ValueError as e:
+        return jsonify({'error': "Can't update User: {}".format(e)}), 400
     return jsonify(user.to_json()), 200
 
 
@@ -135,9 +265,14 @@ def update_user(user_id: str = None) -> str:
 def retreive_auth_user():
     """ GET /users/me
     Return:
-      - Authenticated User object JSON represented
+      - Authenticated User object JSON represented, with an ETag
+      - 304 if If-None-Match has the current ETag
       - 404 if no user is authenticated
     """
-    if request.current_user is None:
+    current_user = g.get('current_user')
+    if current_user is None:
         abort(404)
-    return jsonify(request.current_user.to_json())
+    response = not_modified(current_user.etag())
+    if response is not None:
+        return response
+    return jsonify(current_user.to_json())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Benchmark of the per-request authentication cost of each AUTH_TYPE:
+current_user resolved twice (old before_request) versus once, memoized
+on flask.g
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from models.user import User
+
+
+def strategies(user: User) -> dict:
+    """ Map of AUTH_TYPE to (auth instance, request headers) for user
+    """
+    from api.v1.auth.basic_auth import BasicAuth
+    from api.v1.auth.session_auth import SessionAuth
+    from api.v1.auth.session_exp_auth import SessionExpAuth
+    basic = "Basic " + base64.b64encode(
+        "{}:pwd".format(user.email).encode()).decode()
+    cookie = os.getenv("SESSION_NAME", "_my_session_id")
+    result = {"basic_auth": (BasicAuth(), {"Authorization": basic})}
+    for name, auth in (("session_auth", SessionAuth()),
+                       ("session_exp_auth", SessionExpAuth())):
+        session_id = auth.create_session(user.id)
+        result[name] = (auth, {"Cookie": "{}={}".format(cookie,
+                                                        session_id)})
+    return result
+
+
+def latency(resolve, requests: int = 10000) -> float:
+    """ Return the mean latency of resolve() in microseconds
+    """
+    start = time.perf_counter()
+    for _ in range(requests):
+        resolve()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def compare(app: Flask, auth, headers: dict,
+            requests: int = 10000) -> tuple:
+    """ Return the mean per-request latency, in microseconds, of
+    current_user called twice and of request_user called twice, both
+    inside one pre-built request context so only authentication is timed;
+    the memoized user is dropped from flask.g before each request
+    """
+    from flask import g, request
+    with app.test_request_context(headers=headers):
+        twice = latency(lambda: (auth.current_user(request),
+                                 auth.current_user(request)), requests)
+        once = latency(lambda: (g.pop('current_user', None),
+                                auth.request_user(request),
+                                auth.request_user(request)), requests)
+    return twice, once
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = Flask(__name__)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            User.load_from_file()
+            user = User(email="bob@hbtn.io")
+            user.password = "pwd"
+            user.save()
+            for name, (auth, headers) in strategies(user).items():
+                twice, once = compare(app, auth, headers, requests)
+                print("{}: {:.1f} us resolved twice, {:.1f} us once"
+                      .format(name, twice, once))
+        finally:
+            os.chdir(cwd)
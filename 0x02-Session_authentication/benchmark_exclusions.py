@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+""" Benchmark of the route exclusion check: fnmatch loop versus
+ExclusionMatcher, for growing numbers of rules
+"""
+import fnmatch
+import sys
+import time
+from api.v1.auth.exclusions import ExclusionMatcher
+
+
+def fnmatch_excluded(path: str, excluded_paths: list) -> bool:
+    """ The former Auth.require_auth loop
+    """
+    path = path.rstrip('/') + '/'
+    for excluded_path in excluded_paths:
+        excluded_path = excluded_path.rstrip('/') + '/'
+        if fnmatch.fnmatch(path, excluded_path):
+            return True
+    return False
+
+
+def rules(count: int) -> list:
+    """ count exclusion rules, half exact paths, half glob patterns
+    """
+    return ["/api/v1/public{}/".format(i) if i % 2 else
+            "/api/v1/static{}/*".format(i) for i in range(count)]
+
+
+def check_latency(check, paths: list, checks: int = 10000) -> float:
+    """ Return the mean latency of check(path) in microseconds
+    """
+    start = time.perf_counter()
+    for i in range(checks):
+        check(paths[i % len(paths)])
+    return (time.perf_counter() - start) / checks * 1e6
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [4, 100, 500]
+    paths = ["/api/v1/users/me", "/api/v1/status", "/api/v1/public1/",
+             "/api/v1/static0/logo.png"]
+    for size in sizes:
+        excluded_paths = rules(size) + ["/api/v1/status/"]
+        matcher = ExclusionMatcher(excluded_paths)
+        for path in paths:
+            assert matcher.match(path) == \
+                fnmatch_excluded(path, excluded_paths), path
+        print("{} rules: fnmatch {:.1f} us, matcher {:.1f} us per check"
+              .format(size, check_latency(
+                  lambda path: fnmatch_excluded(path, excluded_paths),
+                  paths),
+                  check_latency(matcher.match, paths)))
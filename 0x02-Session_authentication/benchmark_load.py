@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+""" Benchmark of User.load_from_file and to_json on a large store
+"""
+import os
+import sys
+import tempfile
+import time
+from models.user import User
+build_store = __import__('benchmark_search').build_store
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            build_store(count)
+            start = time.perf_counter()
+            User.load_from_file()
+            print("load {} users: {:.2f}s".format(
+                count, time.perf_counter() - start))
+            start = time.perf_counter()
+            for user in User.all():
+                user.to_json(True)
+            print("to_json {} users: {:.2f}s".format(
+                count, time.perf_counter() - start))
+        finally:
+            os.chdir(cwd)
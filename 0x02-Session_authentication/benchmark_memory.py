@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+""" Benchmark of the memory used per User object
+"""
+import sys
+import tracemalloc
+from models.user import User
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = [User(id="user-{}".format(i),
+                  created_at="2024-05-23T20:00:12",
+                  updated_at="2024-05-23T20:00:12",
+                  email="user{}@hbtn.io".format(i))
+             for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    print("{} users: {:.0f} bytes per user".format(count, used / count))
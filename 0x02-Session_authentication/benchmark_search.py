@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+""" Benchmark of the login lookup User.search({'email': ...})
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from models.user import User
+
+
+def build_store(count: int) -> None:
+    """ Write a .db_User.json with count users in the current directory
+    """
+    objs = {}
+    for i in range(count):
+        obj_id = "user-{}".format(i)
+        objs[obj_id] = {"id": obj_id,
+                        "created_at": "2024-05-23T20:00:12",
+                        "updated_at": "2024-05-23T20:00:12",
+                        "email": "user{}@hbtn.io".format(i),
+                        "_password": None,
+                        "first_name": None,
+                        "last_name": None}
+    with open(".db_User.json", "w") as f:
+        json.dump(objs, f)
+
+
+def lookup_latency(count: int, lookups: int = 1000) -> float:
+    """ Return the mean User.search by email latency in microseconds
+    """
+    start = time.perf_counter()
+    for i in range(lookups):
+        User.search({'email': "user{}@hbtn.io".format(i * 7919 % count)})
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for size in sizes:
+                build_store(size)
+                User.load_from_file()
+                print("{} users: {:.1f} us per lookup".format(
+                    size, lookup_latency(size)))
+        finally:
+            os.chdir(cwd)
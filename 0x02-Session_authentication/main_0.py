@@ -9,7 +9,8 @@ from models.user import User
 user_email = "bob@hbtn.io"
 user_clear_pwd = "H0lbertonSchool98!"
 
-user = User()
+users = User.search({'email': user_email})
+user = users[0] if users else User()
 user.email = user_email
 user.password = user_clear_pwd
 print("New user: {}".format(user.id))
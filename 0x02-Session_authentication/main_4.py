@@ -9,7 +9,8 @@ from models.user import User
 user_email = "bobsession@hbtn.io"
 user_clear_pwd = "fake pwd"
 
-user = User()
+users = User.search({'email': user_email})
+user = users[0] if users else User()
 user.email = user_email
 user.password = user_clear_pwd
 user.save()
@@ -1,39 +1,134 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TypeVar, List, Iterable, Tuple
+import calendar
+import hashlib
+import time
 import uuid
+from models.storage import get_storage
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+_FIELDS = {}
+_SLOTS = {}
+
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(value: str) -> int:
+    """ Parse a TIMESTAMP_FORMAT string into epoch seconds
+
+    datetime.fromisoformat is a C fast path for this format; anything
+    it can't handle goes through strptime.
+    """
+    try:
+        return (datetime.fromisoformat(value) - _EPOCH) // _SECOND
+    except (TypeError, ValueError):
+        return calendar.timegm(time.strptime(value, TIMESTAMP_FORMAT))
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(value: int) -> str:
+    """ Format epoch seconds as a TIMESTAMP_FORMAT string
+    """
+    return (_EPOCH + value * _SECOND).isoformat()
+
+
+def _to_epoch(value) -> int:
+    """ Convert a naive UTC datetime or a TIMESTAMP_FORMAT string to
+    epoch seconds
+    """
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    if isinstance(value, datetime):
+        return (value - _EPOCH) // _SECOND
+    return int(value)
 
 
 class Base():
     """ Base class
+
+    Subclasses declare secondary indexes in `indexes`, mapping an
+    attribute name to whether its values must be unique, e.g.
+    `indexes = {'email': True}`. Equality searches on an indexed
+    attribute are then O(1) instead of a scan.
+
+    Attributes live in `__slots__` and timestamps are kept as epoch
+    seconds; `created_at`/`updated_at` still read as datetimes.
     """
+    __slots__ = ('id', '_created_at', '_updated_at')
+    indexes = {}
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
         self.id = kwargs.get('id', str(uuid.uuid4()))
+        now = int(time.time())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created_at = _to_epoch(kwargs.get('created_at'))
         else:
-            self.created_at = datetime.utcnow()
+            self._created_at = now
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self._updated_at = _to_epoch(kwargs.get('updated_at'))
         else:
-            self.updated_at = datetime.utcnow()
+            self._updated_at = now
+
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation date (naive UTC)
+        """
+        return _EPOCH + self._created_at * _SECOND
+
+    @created_at.setter
+    def created_at(self, value):
+        """ Setter of the creation date
+        """
+        self._created_at = _to_epoch(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update date (naive UTC)
+        """
+        return _EPOCH + self._updated_at * _SECOND
+
+    @updated_at.setter
+    def updated_at(self, value):
+        """ Setter of the last update date
+        """
+        self._updated_at = _to_epoch(value)
+
+    @classmethod
+    def _fields(cls) -> Tuple[str]:
+        """ Names of the attributes of the class, in declaration order,
+        as they appear in to_json
+        """
+        fields = _FIELDS.get(cls)
+        if fields is None:
+            fields = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get('__slots__', ()):
+                    if name in ('_created_at', '_updated_at'):
+                        name = name[1:]
+                    fields.append(name)
+            fields = _FIELDS[cls] = tuple(fields)
+        return fields
+
+    @classmethod
+    def _slots(cls) -> Tuple[str]:
+        """ Names of the slots of the class, in declaration order
+        """
+        slots = _SLOTS.get(cls)
+        if slots is None:
+            slots = _SLOTS[cls] = tuple(
+                name for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get('__slots__', ()))
+        return slots
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -48,90 +143,98 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key in self.__class__._fields():
             if not for_serialization and key[0] == '_':
                 continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+            if key == 'created_at':
+                result[key] = format_timestamp(self._created_at)
+            elif key == 'updated_at':
+                result[key] = format_timestamp(self._updated_at)
             else:
-                result[key] = value
+                result[key] = getattr(self, key)
         return result
 
+    def etag(self) -> str:
+        """ Strong entity tag of the current object: its ID, last update
+        and a digest of all its attributes, so updates within the same
+        second still change it
+        """
+        values = repr(tuple(getattr(self, name) for name in
+                            self.__class__._slots()))
+        digest = hashlib.blake2b(values.encode(), digest_size=8)
+        return "{}-{:x}-{}".format(self.id, self._updated_at or 0,
+                                   digest.hexdigest())
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from the storage backend
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        get_storage().load(cls)
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Persist all objects held in memory by the storage backend
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        get_storage().save_to_file(cls)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @staticmethod
+    def flush():
+        """ Write the changes queued by the storage backend
+        """
+        get_storage().flush()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self._updated_at = int(time.time())
+        get_storage().save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        get_storage().remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return get_storage().count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """ Return all objects
         """
-        return cls.search()
+        return get_storage().all(cls)
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return get_storage().get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return get_storage().search(cls, attributes)
+
+    @classmethod
+    def version(cls) -> str:
+        """ Version of the whole collection: it changes whenever an
+        object of cls is saved or removed
+        """
+        return get_storage().version(cls)
+
+    @classmethod
+    def query(cls, filters: dict = {}, prefixes: dict = {},
+              sort: str = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Return the objects matching filters (equality) and prefixes,
+        sorted by sort, and the plan the storage used
+        """
+        return get_storage().query(cls, filters, prefixes, sort)
+
+    @classmethod
+    def page(cls, limit: int, after: str = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by ID, after the ID `after`
+        """
+        return get_storage().page(cls, limit, after)
@@ -0,0 +1,1035 @@
+#!/usr/bin/env python3
+""" JSON file storage module
+"""
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
+from typing import TypeVar, List, Iterable, Tuple
+from os import getenv, path
+import atexit
+import json
+import mmap
+import multiprocessing.util
+import os
+import re
+import struct
+import threading
+import uuid
+from models.locks import FileLock, RWLock
+from models.storage import Storage, sort_key
+
+
+JOURNAL_MIN_COMPACT = 1000
+_snapshot_line = re.compile(rb'^("(?:[^"\\]|\\.)*"): ', re.M)
+
+
+class _LazySnapshot():
+    """ Objects of a mapped line-delimited snapshot not built yet
+
+    They are found through the offset index written along the snapshot
+    (.db_<Class>.idx): a JSON header line, then the snapshot offsets of
+    the objects and their UTF-8 IDs in fixed-width NUL-padded slots,
+    both sorted by ID, then for each indexed attribute the JSON of its
+    values, sorted, with the position of their objects. The index is
+    mapped too and searched by bisection, so opening a snapshot or
+    looking up an indexed value costs the same whatever its size; only
+    the IDs built or dropped since are kept in memory. Without an index
+    the snapshot is scanned for its keys.
+    """
+
+    def __init__(self, mm: mmap.mmap, index: mmap.mmap = None,
+                 header: dict = None):
+        """ Initialize from the mapped snapshot and its mapped index
+        """
+        self.mmap = mm
+        self.index = index
+        self.gone = set()
+        if index is None:
+            self._offsets = {}
+            for m in _snapshot_line.finditer(mm):
+                key = m.group(1)
+                if b"\\" in key:
+                    self._offsets[json.loads(key)] = m.end()
+                else:
+                    self._offsets[key[1:-1].decode()] = m.end()
+            self.count = len(self._offsets)
+            self.saved = {}
+            return
+        self._offsets = None
+        self.count = header["count"]
+        self.width = header["width"]
+        self.saved = header["values"]
+        self._base = header["base"]
+        self._ids_at = self._base + 8 * self.count
+
+    def __len__(self) -> int:
+        """ Number of objects not built yet
+        """
+        return self.count - len(self.gone)
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Whether obj_id is still to be built
+        """
+        return obj_id not in self.gone and self._offset(obj_id) is not None
+
+    @staticmethod
+    def _bisect(key: bytes, count: int, key_at) -> int:
+        """ First of count rows whose key_at(row) isn't below key
+        """
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slot(self, pos: int) -> bytes:
+        """ Padded ID slot at pos
+        """
+        start = self._ids_at + pos * self.width
+        return self.index[start:start + self.width]
+
+    def _id(self, pos: int) -> str:
+        """ ID at pos
+        """
+        return self._slot(pos).rstrip(b"\0").decode("utf-8",
+                                                      "surrogatepass")
+
+    def _position(self, obj_id: str) -> Tuple[int, bool]:
+        """ Position of the first ID not below obj_id, and whether it is
+        obj_id
+        """
+        key = obj_id.encode("utf-8", "surrogatepass")
+        longer = len(key) > self.width
+        key = key[:self.width].ljust(self.width, b"\0")
+        pos = self._bisect(key, self.count, self._slot)
+        found = pos < self.count and self._slot(pos) == key
+        if found and longer:
+            return pos + 1, False
+        return pos, found
+
+    def _offset(self, obj_id: str) -> int:
+        """ Snapshot offset of obj_id, or None
+        """
+        if self._offsets is not None:
+            return self._offsets.get(obj_id)
+        pos, found = self._position(obj_id)
+        if not found:
+            return None
+        return struct.unpack_from("<q", self.index, self._base + 8 * pos)[0]
+
+    def peek(self, obj_id: str) -> bytes:
+        """ JSON of obj_id if it is still to be built, or None
+        """
+        if obj_id in self.gone:
+            return None
+        start = self._offset(obj_id)
+        if start is None:
+            return None
+        end = self.mmap.find(b"\n", start)
+        return self.mmap[start:end].rstrip(b",")
+
+    def pop(self, obj_id: str) -> bytes:
+        """ JSON of obj_id, which won't be built from here again, or None
+        """
+        line = self.peek(obj_id)
+        if line is not None:
+            self.gone.add(obj_id)
+        return line
+
+    def discard(self, obj_id: str):
+        """ Never build obj_id from here
+        """
+        if obj_id in self:
+            self.gone.add(obj_id)
+
+    def ids(self) -> List[str]:
+        """ IDs of the objects not built yet, sorted when indexed
+        """
+        if self._offsets is not None:
+            ids = list(self._offsets)
+        else:
+            width = self.width
+            ids = self.index[self._ids_at:self._ids_at + self.count * width]
+            ids = ids.decode("utf-8", "surrogatepass")
+            if len(ids) == self.count * width:
+                ids = [ids[i:i + width].rstrip("\0")
+                       for i in range(0, len(ids), width)]
+            else:
+                ids = [self._id(pos) for pos in range(self.count)]
+        if self.gone:
+            ids = [obj_id for obj_id in ids if obj_id not in self.gone]
+        return ids
+
+    def ids_after(self, after: str, limit: int) -> List[str]:
+        """ Up to limit IDs of objects not built yet, in order, after the
+        ID `after`
+        """
+        if self._offsets is not None:
+            ids = sorted(obj_id for obj_id in self.ids()
+                         if after is None or obj_id > after)
+            return ids[:limit]
+        pos = 0
+        if after is not None:
+            pos, found = self._position(after)
+            pos += found
+        ids = []
+        while pos < self.count and len(ids) < limit:
+            obj_id = self._id(pos)
+            if obj_id not in self.gone:
+                ids.append(obj_id)
+            pos += 1
+        return ids
+
+    def has_values(self, attrs: Iterable[str]) -> bool:
+        """ Whether the index saved the values of all attrs
+        """
+        return all(attr in self.saved for attr in attrs)
+
+    def _find(self, attr: str, key: bytes, prefix: bool) -> List[str]:
+        """ IDs not built yet whose saved attr is key, or starts with it
+        """
+        at, count = self.saved[attr]
+        at += self._base
+        positions_at = at + 8 * (count + 1)
+        values_at = positions_at + 8 * count
+        index = self.index
+
+        def key_at(row):
+            start, end = struct.unpack_from("<2q", index, at + 8 * row)
+            return index[values_at + start:values_at + end]
+
+        ids = []
+        for row in range(self._bisect(key, count, key_at), count):
+            found = key_at(row)
+            if found != key and not (prefix and found.startswith(key)):
+                break
+            obj_id = self._id(struct.unpack_from(
+                "<q", index, positions_at + 8 * row)[0])
+            if obj_id not in self.gone:
+                ids.append(obj_id)
+        return ids
+
+    def find(self, attr: str, value) -> List[str]:
+        """ IDs not built yet whose attr was saved as value; TypeError
+        if value has no JSON form
+        """
+        return self._find(attr, json.dumps(value).encode(), False)
+
+    def find_prefix(self, attr: str, prefix: str) -> List[str]:
+        """ IDs not built yet whose attr was saved as a string starting
+        with prefix (JSON escapes each character on its own, so the
+        JSON of such strings starts with the JSON of prefix unquoted)
+        """
+        return self._find(attr, json.dumps(prefix)[:-1].encode(), True)
+
+    def close(self):
+        """ Release the mapped files
+        """
+        self.mmap.close()
+        if self.index is not None:
+            self.index.close()
+
+
+class JSONStorage(Storage):
+    """ Storage backend keeping objects in memory, persisted to
+    .db_<Class>.json snapshots and .db_<Class>.journal journals
+
+    Threads of a process share the objects under a readers/writer lock.
+    Processes serialize writes with an fcntl lock on .db_<Class>.lock,
+    and each process picks up the others' changes when the snapshot or
+    the journal changes on disk.
+
+    Declared indexes (`indexes` of the class) are kept as hash indexes
+    on the attribute values, plus an ordered index of IDs for
+    pagination. They hold the objects built so far: those of a lazily
+    loaded snapshot not built yet are looked up in its offset index.
+    """
+
+    def __init__(self):
+        """ Initialize the backend (DB_WRITE_BEHIND_MS,
+        DB_WRITE_BEHIND_CHANGES, DB_LAZY_LOAD)
+        """
+        self.write_behind_ms = int(getenv("DB_WRITE_BEHIND_MS", "0"))
+        self.write_behind_changes = int(
+            getenv("DB_WRITE_BEHIND_CHANGES", "100"))
+        self.lazy_load = getenv("DB_LAZY_LOAD", "0") == "1"
+        self.data = {}
+        self.indexes = {}
+        self.journal_sizes = {}
+        self.pending = {}
+        self.flushing = {}
+        self.lazy = {}
+        self.file_states = {}
+        self.versions = {}
+        self._version_token = uuid.uuid4().hex[:8]
+        self._lock = RWLock()
+        self._file_locks = {}
+        self._pending_cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """ Give a forked child its own locks and write-behind thread;
+        the changes the parent queued stay the parent's to write
+        """
+        self._lock = RWLock()
+        self._file_locks = {}
+        self._pending_cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self.pending = {}
+        self.flushing = {}
+
+    def _file_lock(self, s_class: str) -> FileLock:
+        """ The inter-process lock guarding the files of a class
+        """
+        lock = self._file_locks.get(s_class)
+        if lock is None:
+            lock = self._file_locks.setdefault(
+                s_class, FileLock(".db_{}.lock".format(s_class)))
+        return lock
+
+    def _bump_version(self, s_class: str):
+        """ Record a change of the objects of s_class
+        """
+        self.versions[s_class] = self.versions.get(s_class, 0) + 1
+
+    def _reset_indexes(self, cls, ids: Iterable[str] = ()):
+        """ Create empty indexes for the declared attributes, and the
+        ordered index of IDs used for pagination
+        """
+        self._bump_version(cls.__name__)
+        self.indexes[cls.__name__] = {
+            "values": {},
+            "attrs": {attr: {} for attr in cls.indexes},
+            "order": sorted(ids),
+            "sorted": {attr: None for attr in cls.indexes},
+        }
+
+    def _index_add(self, obj: TypeVar('Base')):
+        """ Add obj to the indexes of its class
+        """
+        index = self.indexes[obj.__class__.__name__]
+        order = index["order"]
+        pos = bisect_left(order, obj.id)
+        if pos == len(order) or order[pos] != obj.id:
+            order.insert(pos, obj.id)
+        values = {}
+        for attr, buckets in index["attrs"].items():
+            value = getattr(obj, attr, None)
+            try:
+                bucket = buckets.get(value)
+            except TypeError:
+                continue
+            if bucket is None:
+                bucket = buckets[value] = {}
+                keys = index["sorted"][attr]
+                if keys is not None and isinstance(value, str):
+                    insort(keys, value)
+            bucket[obj.id] = obj
+            values[attr] = value
+        index["values"][obj.id] = values
+
+    def _index_remove(self, cls, obj_id: str, forget: bool = False):
+        """ Remove the object obj_id of cls from the indexes, and from
+        the ordered index too when it is forgotten for good
+        """
+        index = self.indexes[cls.__name__]
+        if forget:
+            order = index["order"]
+            pos = bisect_left(order, obj_id)
+            if pos < len(order) and order[pos] == obj_id:
+                del order[pos]
+        values = index["values"].pop(obj_id, {})
+        for attr, value in values.items():
+            bucket = index["attrs"][attr].get(value)
+            if bucket is None:
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 0:
+                del index["attrs"][attr][value]
+                keys = index["sorted"][attr]
+                if keys is not None and isinstance(value, str):
+                    pos = bisect_left(keys, value)
+                    if pos < len(keys) and keys[pos] == value:
+                        del keys[pos]
+
+    def _indexed(self, cls) -> bool:
+        """ Tell whether the indexes of cls cover every object, built or
+        still in the mapped snapshot
+        """
+        lazy = self.lazy.get(cls.__name__)
+        return lazy is None or lazy.has_values(cls.indexes)
+
+    def _lookup(self, cls, attr: str, value) -> List[TypeVar('Base')]:
+        """ Objects of cls whose indexed attr is value, building those
+        still in the mapped snapshot, or None if value can't be indexed
+        """
+        lazy = self.lazy.get(cls.__name__)
+        try:
+            bucket = self.indexes[cls.__name__]["attrs"][attr].get(value, {})
+            lazy_ids = lazy.find(attr, value) if lazy else []
+        except TypeError:
+            return None
+        result = list(bucket.values())
+        for obj_id in lazy_ids:
+            obj = self._materialize(cls, obj_id)
+            if obj is not None:
+                result.append(obj)
+        return result
+
+    def _check_unique(self, obj: TypeVar('Base')):
+        """ Raise ValueError if obj takes a value of a unique index
+        already held by another object
+
+        Values obj already had when it was last stored pass, so objects
+        duplicated before the index was declared can still be updated.
+        """
+        cls = obj.__class__
+        if any(cls.indexes.values()) and not self._indexed(cls):
+            self._materialize_all(cls)
+        index = self.indexes[cls.__name__]
+        lazy = self.lazy.get(cls.__name__)
+        previous = index["values"].get(obj.id)
+        if previous is None:
+            saved = lazy.peek(obj.id) if lazy else None
+            previous = {} if saved is None else json.loads(saved)
+        for attr, unique in cls.indexes.items():
+            if not unique:
+                continue
+            value = getattr(obj, attr, None)
+            if value is None:
+                continue
+            if attr in previous and previous[attr] == value:
+                continue
+            try:
+                holders = list(index["attrs"][attr].get(value, {}))
+                if lazy:
+                    holders += lazy.find(attr, value)
+            except TypeError:
+                continue
+            if any(obj_id != obj.id for obj_id in holders):
+                raise ValueError("{} {} already exists".format(attr, value))
+
+    def _map_snapshot(self, cls, file_path: str) -> bool:
+        """ Map a line-delimited snapshot, and its offset index if any
+
+        Returns False if the snapshot is not in the line-delimited layout
+        written by _write_snapshot.
+        """
+        with open(file_path, 'rb') as f:
+            if f.read(2) != b"{\n":
+                return False
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        self.lazy[cls.__name__] = _LazySnapshot(
+            mm, *self._map_offset_index(cls, stat))
+        return True
+
+    def _map_offset_index(self, cls, stat: os.stat_result) -> tuple:
+        """ (mapped index, header) of the offset index written along the
+        snapshot, or () if it is missing or does not belong to this
+        snapshot
+        """
+        index_path = ".db_{}.idx".format(cls.__name__)
+        try:
+            with open(index_path, 'rb') as f:
+                header_line = f.readline()
+                header = json.loads(header_line)
+                if header.get("size") != stat.st_size or \
+                        header.get("mtime_ns") != stat.st_mtime_ns or \
+                        "width" not in header:
+                    return ()
+                header["base"] = len(header_line)
+                return (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ),
+                        header)
+        except (OSError, ValueError):
+            return ()
+
+    def _unmap_snapshot(self, cls):
+        """ Release the mapped snapshot, if any
+        """
+        lazy = self.lazy.pop(cls.__name__, None)
+        if lazy is not None:
+            lazy.close()
+
+    def _forget_lazy(self, cls, obj_id: str):
+        """ Drop an object from the mapped snapshot, if it is there
+        """
+        lazy = self.lazy.get(cls.__name__)
+        if lazy is not None:
+            lazy.discard(obj_id)
+
+    def _materialize(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Build one object from the mapped snapshot
+        """
+        lazy = self.lazy.get(cls.__name__)
+        line = lazy.pop(obj_id) if lazy is not None else None
+        if line is None:
+            return None
+        obj = cls(**json.loads(line))
+        self.data[cls.__name__][obj_id] = obj
+        self._index_add(obj)
+        if len(lazy) == 0:
+            self._unmap_snapshot(cls)
+        return obj
+
+    def _materialize_all(self, cls):
+        """ Build every object still left in the mapped snapshot
+        """
+        lazy = self.lazy.get(cls.__name__)
+        if lazy is None:
+            return
+        for obj_id in lazy.ids():
+            self._materialize(cls, obj_id)
+
+    def save_to_file(self, cls):
+        """ Compact the objects of cls into a new snapshot, after
+        picking up the changes of other processes
+        """
+        with self._lock.write(), self._file_lock(cls.__name__).hold(True):
+            self._catch_up(cls)
+            self._write_snapshot(cls)
+
+    def _write_snapshot(self, cls):
+        """ Save all objects of cls to file
+
+        Writes a new snapshot atomically and empties the journal. The
+        snapshot holds one object per line, and .db_<Class>.idx keeps
+        the offset and the indexed values of each object, in the layout
+        read by _LazySnapshot, so it can be loaded lazily and still
+        answer indexed lookups.
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        index_path = ".db_{}.idx".format(s_class)
+        self._materialize_all(cls)
+        lines = []
+        ids = []
+        offsets = []
+        values = {attr: [] for attr in cls.indexes}
+        # json.dumps output is ASCII, so lengths are byte offsets
+        offset = len("{\n")
+        for obj_id, obj in list(self.data[s_class].items()):
+            key = json.dumps(obj_id) + ": "
+            line = key + json.dumps(obj.to_json(True))
+            ids.append(obj_id)
+            offsets.append(offset + len(key))
+            for attr in values:
+                values[attr].append(getattr(obj, attr, None))
+            offset += len(line) + len(",\n")
+            lines.append(line)
+
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("{\n" + ",\n".join(lines) + "\n}\n")
+        stat = os.stat(tmp_path)
+        keys = [obj_id.encode("utf-8", "surrogatepass") for obj_id in ids]
+        if any(b"\0" in key for key in keys):
+            # NUL pads the ID slots: such IDs are found by a scan instead
+            if path.exists(index_path):
+                os.remove(index_path)
+        else:
+            rows = sorted(range(len(keys)), key=keys.__getitem__)
+            width = max(map(len, keys), default=0)
+            body = [struct.pack("<{}q".format(len(rows)),
+                                *(offsets[row] for row in rows)),
+                    b"".join(keys[row].ljust(width, b"\0")
+                             for row in rows)]
+            size = len(body[0]) + len(body[1])
+            saved = {}
+            for attr, column in values.items():
+                entries = sorted((json.dumps(column[row]).encode(), pos)
+                                 for pos, row in enumerate(rows))
+                ends = accumulate((len(entry[0]) for entry in entries),
+                                  initial=0)
+                body += [struct.pack("<{}q".format(len(rows) + 1), *ends),
+                         struct.pack("<{}q".format(len(rows)),
+                                     *(entry[1] for entry in entries)),
+                         b"".join(entry[0] for entry in entries)]
+                saved[attr] = [size, len(rows)]
+                size += sum(map(len, body[-3:]))
+            header = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                      "count": len(rows), "width": width, "values": saved}
+            with open(index_path + ".tmp", 'wb') as f:
+                f.write(json.dumps(header).encode() + b"\n")
+                f.writelines(body)
+            os.replace(index_path + ".tmp", index_path)
+        os.replace(tmp_path, file_path)
+        if path.exists(journal_path):
+            os.remove(journal_path)
+        self.journal_sizes[s_class] = 0
+        self.file_states[s_class] = {"snapshot": _file_key(file_path),
+                                     "journal": None, "offset": 0}
+
+    def _replay_journal(self, cls, offset: int = 0,
+                        skip: set = set()) -> bool:
+        """ Apply the journal entries found after offset, except those
+        of the ids in skip, and record how far it was read
+
+        Returns True if the journal ends with a torn write.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        state = self.file_states[s_class]
+        state["journal"] = _file_key(journal_path)
+        state["offset"] = offset
+        if state["journal"] is None:
+            return False
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn write at the end of the journal
+                    state["torn"] = True
+                    return True
+                state["offset"] += len(line)
+                self.journal_sizes[s_class] = \
+                    self.journal_sizes.get(s_class, 0) + 1
+                if entry["id"] in skip:
+                    continue
+                self._apply_entry(cls, entry)
+        return False
+
+    def _apply_entry(self, cls, entry: dict):
+        """ Apply one journal entry to the objects and the indexes
+        """
+        s_class = cls.__name__
+        self._bump_version(s_class)
+        self._forget_lazy(cls, entry["id"])
+        self.data[s_class].pop(entry["id"], None)
+        self._index_remove(cls, entry["id"], forget=entry["op"] == "delete")
+        if entry["op"] == "upsert":
+            obj = cls(**entry["obj"])
+            self.data[s_class][entry["id"]] = obj
+            self._index_add(obj)
+
+    def _write_journal(self, cls, entries: List[dict], sync: bool = False,
+                       obj: TypeVar('Base') = None):
+        """ Append entries to the journal in one write, compacting it
+        into the snapshot once it outgrows the number of objects
+
+        Changes appended by other processes since the last read are
+        applied first, under the exclusive file lock. When obj is given
+        (the object of the single entry), its unique indexes are checked
+        against those changes and it is stored in memory only once the
+        entry is written.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self._lock.write(), self._file_lock(s_class).hold(True):
+            torn = self._catch_up(cls, [] if obj else entries) or \
+                self.file_states[s_class].get("torn", False)
+            if obj is not None:
+                self._check_unique(obj)
+            with open(journal_path, 'ab') as f:
+                if torn:
+                    f.truncate(self.file_states[s_class]["offset"])
+                    self.file_states[s_class]["torn"] = False
+                f.write(data.encode())
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+            if obj is not None:
+                self._put(obj)
+            state = self.file_states[s_class]
+            state["offset"] += len(data)
+            state["journal"] = _file_key(journal_path)
+            self.journal_sizes[s_class] = \
+                self.journal_sizes.get(s_class, 0) + len(entries)
+            if self.journal_sizes[s_class] >= max(
+                    JOURNAL_MIN_COMPACT, len(self.data[s_class])):
+                self._write_snapshot(cls)
+
+    def _append_journal(self, cls, entry: dict):
+        """ Record one change
+
+        With DB_WRITE_BEHIND_MS > 0 the change is only queued: the last
+        change of each object is flushed by a background thread every
+        DB_WRITE_BEHIND_MS, or as soon as DB_WRITE_BEHIND_CHANGES are
+        pending. Queued changes are never checked against the unique
+        indexes of other processes, so write-behind mode only enforces
+        uniqueness within a process.
+        """
+        if self.write_behind_ms <= 0:
+            self._write_journal(cls, [entry])
+            return
+        with self._pending_cond:
+            _, pending = self.pending.setdefault(cls.__name__, (cls, {}))
+            pending.pop(entry["id"], None)
+            pending[entry["id"]] = entry
+            self._start_flusher()
+            if len(pending) >= self.write_behind_changes:
+                self._pending_cond.notify()
+
+    def flush(self):
+        """ Write all pending changes, one fsync'ed write per class
+        """
+        with self._flush_lock:
+            with self._pending_cond:
+                self.flushing.update(self.pending)
+                self.pending.clear()
+            for s_class, (cls, pending) in list(self.flushing.items()):
+                if len(pending) > 0:
+                    self._write_journal(cls, list(pending.values()),
+                                        sync=True)
+                with self._pending_cond:
+                    del self.flushing[s_class]
+
+    def _flush_loop(self):
+        """ Background thread of the write-behind mode
+        """
+        while True:
+            with self._pending_cond:
+                self._pending_cond.wait(self.write_behind_ms / 1000)
+            self.flush()
+
+    def _start_flusher(self):
+        """ Start the write-behind thread once, flushing again at exit
+
+        multiprocessing workers end with os._exit, which skips atexit:
+        they flush from a multiprocessing finalizer instead.
+        """
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop,
+                                         name="db-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=0)
+
+    def load(self, cls):
+        """ Load all objects of cls from file
+
+        Loads the snapshot, then replays the journal on top of it.
+        With DB_LAZY_LOAD=1 the snapshot is only mapped and indexed by
+        offset; objects are built when first touched.
+        """
+        self.flush()
+        with self._lock.write(), self._file_lock(cls.__name__).hold(True):
+            if self._load(cls):
+                self._write_snapshot(cls)
+
+    def _load(self, cls, local: List[dict] = []) -> bool:
+        """ Rebuild the objects of cls from the files, then apply the
+        local entries not written yet
+
+        Returns True if the journal ends with a torn write.
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        self._unmap_snapshot(cls)
+        objs = self.data[s_class] = {}
+        self.journal_sizes[s_class] = 0
+        self.file_states[s_class] = {"snapshot": _file_key(file_path),
+                                     "journal": None, "offset": 0}
+
+        if path.exists(file_path) and not \
+                (self.lazy_load and self._map_snapshot(cls, file_path)):
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    objs[obj_id] = cls(**obj_json)
+
+        if len(self.lazy.get(s_class, ())) == 0:
+            self._unmap_snapshot(cls)
+        self._reset_indexes(cls, objs)
+        for obj in objs.values():
+            self._index_add(obj)
+        torn = self._replay_journal(cls)
+        for entry in local:
+            self._apply_entry(cls, entry)
+        return torn
+
+    def _stale(self, cls) -> bool:
+        """ Tell whether the files of cls changed since they were read,
+        or were never read
+        """
+        s_class = cls.__name__
+        state = self.file_states.get(s_class)
+        if state is None:
+            return True
+        return state["snapshot"] != _file_key(
+            ".db_{}.json".format(s_class)) or state["journal"] != \
+            _file_key(".db_{}.journal".format(s_class))
+
+    def _catch_up(self, cls, own: List[dict] = []) -> bool:
+        """ Apply what other processes wrote since the files were read
+
+        `own` entries are about to be written by this process, and,
+        like the pending write-behind entries, win over older ones.
+        The caller holds the store lock for writing and the file lock.
+        Returns True if the journal ends with a torn write.
+        """
+        s_class = cls.__name__
+        if not self._stale(cls):
+            return False
+        with self._pending_cond:
+            local = list(self.flushing.get(s_class, (cls, {}))[1]
+                         .values()) + \
+                list(self.pending.get(s_class, (cls, {}))[1].values())
+        local += own
+        state = self.file_states.get(s_class)
+        if state is None:
+            return self._load(cls, local)
+        journal = _file_key(".db_{}.journal".format(s_class))
+        if state["snapshot"] != _file_key(".db_{}.json".format(s_class)) \
+                or journal is None or state["journal"] is None \
+                or journal[0] != state["journal"][0] \
+                or journal[2] < state["offset"]:
+            return self._load(cls, local)
+        return self._replay_journal(cls, state["offset"],
+                                    {entry["id"] for entry in local})
+
+    def _refresh(self, cls):
+        """ Pick up changes made by other processes, if any
+        """
+        if not self._stale(cls):
+            return
+        with self._lock.write(), \
+                self._file_lock(cls.__name__).hold(exclusive=False):
+            self._catch_up(cls)
+
+    def _reading(self, cls):
+        """ Lock to hold while reading cls: building lazily loaded
+        objects writes to the objects, so it needs the writer side
+        """
+        if self.lazy.get(cls.__name__):
+            return self._lock.write()
+        return self._lock.read()
+
+    def _put(self, obj: TypeVar('Base')):
+        """ Store obj in memory and in the indexes
+        """
+        cls = obj.__class__
+        self._bump_version(cls.__name__)
+        self._index_remove(cls, obj.id)
+        self._forget_lazy(cls, obj.id)
+        self.data[cls.__name__][obj.id] = obj
+        self._index_add(obj)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Save obj
+
+        Unique indexes are checked again under the exclusive file lock,
+        after the other processes' changes are applied, so two workers
+        can't both save the same unique value (except in write-behind
+        mode, see _append_journal).
+        """
+        cls = obj.__class__
+        self._refresh(cls)
+        entry = {"op": "upsert", "id": obj.id, "obj": obj.to_json(True)}
+        with self._lock.write():
+            self._check_unique(obj)
+            if self.write_behind_ms <= 0:
+                self._write_journal(cls, [entry], obj=obj)
+                return
+            self._put(obj)
+            self._append_journal(cls, entry)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove obj
+        """
+        cls = obj.__class__
+        s_class = cls.__name__
+        self._refresh(cls)
+        with self._lock.write():
+            self._materialize(cls, obj.id)
+            if self.data[s_class].get(obj.id) is not None:
+                self._bump_version(s_class)
+                del self.data[s_class][obj.id]
+                self._index_remove(cls, obj.id, forget=True)
+                self._append_journal(cls, {"op": "delete", "id": obj.id})
+
+    def count(self, cls) -> int:
+        """ Count all objects of cls
+        """
+        s_class = cls.__name__
+        self._refresh(cls)
+        with self._lock.read():
+            return len(self.data[s_class]) + len(self.lazy.get(s_class, ()))
+
+    def get(self, cls, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID
+        """
+        s_class = cls.__name__
+        self._refresh(cls)
+        with self._reading(cls):
+            obj = self.data[s_class].get(id)
+            if obj is None:
+                obj = self._materialize(cls, id)
+            return obj
+
+    def search(self, cls,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects of cls with matching attributes
+
+        Uses an index when one of the attributes is indexed, and only
+        checks the remaining attributes on the candidates it returns.
+        """
+        s_class = cls.__name__
+        self._refresh(cls)
+
+        def _search(obj):
+            if len(attributes) == 0:
+                return True
+            for k, v in attributes.items():
+                if (getattr(obj, k) != v):
+                    return False
+            return True
+
+        with self._reading(cls):
+            candidates = None
+            index = self.indexes[s_class]["attrs"]
+            for k, v in attributes.items():
+                if k not in index or not self._indexed(cls):
+                    continue
+                candidates = self._lookup(cls, k, v)
+                if candidates is not None:
+                    break
+            if candidates is None:
+                self._materialize_all(cls)
+                candidates = self.data[s_class].values()
+
+            return list(filter(_search, candidates))
+
+    def version(self, cls) -> str:
+        """ Version of the objects of cls
+
+        The counter is kept by this process, so the version also names
+        the process: two workers never share a version for different
+        contents.
+        """
+        self._refresh(cls)
+        return "{}.{:x}.{:x}".format(self._version_token, os.getpid(),
+                                     self.versions.get(cls.__name__, 0))
+
+    def query(self, cls, filters: dict = {}, prefixes: dict = {},
+              sort: str = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Query planner: return the objects of cls matching filters
+        (equality) and prefixes (string prefix), sorted by sort (a
+        field name, '-' prefixed for descending), with the chosen plan
+
+        An equality filter on the ID is a primary key lookup; an
+        equality filter on an indexed attribute is answered from its
+        hash index, else a prefix on an indexed attribute walks its
+        sorted values; anything else is a scan.
+        """
+        s_class = cls.__name__
+        self._refresh(cls)
+        with self._reading(cls):
+            index = self.indexes[s_class]
+            plan = None
+            candidates = None
+            if isinstance(filters.get('id'), str):
+                obj = self.data[s_class].get(filters['id'])
+                if obj is None:
+                    obj = self._materialize(cls, filters['id'])
+                candidates = [obj] if obj is not None else []
+                plan = "primary-key"
+            if candidates is None:
+                for k, v in filters.items():
+                    if k not in index["attrs"] or not self._indexed(cls):
+                        continue
+                    candidates = self._lookup(cls, k, v)
+                    if candidates is not None:
+                        plan = "index:{}".format(k)
+                        break
+            if candidates is None:
+                for k, prefix in prefixes.items():
+                    if k not in index["attrs"] or not self._indexed(cls):
+                        continue
+                    candidates = self._prefix_candidates(cls, k, prefix)
+                    plan = "index-prefix:{}".format(k)
+                    break
+            if candidates is None:
+                self._materialize_all(cls)
+                candidates = list(self.data[s_class].values())
+                plan = "scan"
+
+        def _match(obj):
+            for k, v in filters.items():
+                if getattr(obj, k) != v:
+                    return False
+            for k, prefix in prefixes.items():
+                value = getattr(obj, k)
+                if not isinstance(value, str) or not value.startswith(prefix):
+                    return False
+            return True
+
+        result = list(filter(_match, candidates))
+        if sort:
+            attr = sort.lstrip('-')
+            if attr in ('created_at', 'updated_at'):
+                attr = '_' + attr
+            result.sort(key=sort_key(attr), reverse=sort.startswith('-'))
+            plan += ", sort:{}".format(sort)
+        return result, plan
+
+    def _prefix_candidates(self, cls, attr: str,
+                           prefix: str) -> List[TypeVar('Base')]:
+        """ Objects of cls whose attr starts with prefix, from the sorted
+        values of its index (built on first use) and the offset index of
+        the mapped snapshot
+        """
+        index = self.indexes[cls.__name__]
+        buckets = index["attrs"][attr]
+        keys = index["sorted"][attr]
+        if keys is None:
+            keys = index["sorted"][attr] = sorted(
+                value for value in buckets if isinstance(value, str))
+        candidates = []
+        for pos in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[pos].startswith(prefix):
+                break
+            candidates.extend(buckets[keys[pos]].values())
+        lazy = self.lazy.get(cls.__name__)
+        if lazy:
+            for obj_id in lazy.find_prefix(attr, prefix):
+                obj = self._materialize(cls, obj_id)
+                if obj is not None:
+                    candidates.append(obj)
+            candidates.sort(key=lambda obj: getattr(obj, attr))
+        return candidates
+
+    def page(self, cls, limit: int,
+             after: str = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects of cls ordered by ID, starting
+        after the ID `after`, from the ordered index merged with the
+        offset index of the mapped snapshot
+        """
+        s_class = cls.__name__
+        self._refresh(cls)
+        with self._reading(cls):
+            order = self.indexes[s_class]["order"]
+            start = 0 if after is None else bisect_right(order, after)
+            ids = order[start:start + limit]
+            lazy = self.lazy.get(s_class)
+            if lazy:
+                ids = sorted(ids + lazy.ids_after(after, limit))[:limit]
+            result = []
+            for obj_id in ids:
+                obj = self.data[s_class].get(obj_id)
+                if obj is None:
+                    obj = self._materialize(cls, obj_id)
+                result.append(obj)
+            return result
+
+
+def _file_key(file_path: str) -> Tuple[int, int, int]:
+    """ (inode, mtime, size) of a file, or None if it doesn't exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
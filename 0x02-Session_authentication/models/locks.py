@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+""" Locks module
+"""
+from contextlib import contextmanager
+import fcntl
+import os
+import threading
+
+
+class RWLock():
+    """ Readers/writer lock
+
+    Many readers or one writer at a time; waiting writers block new
+    readers so they are not starved. The writer may re-enter both
+    read() and write().
+    """
+
+    def __init__(self):
+        """ Initialize the lock
+        """
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """ Hold the lock for reading
+        """
+        nested = False
+        with self._cond:
+            if self._writer == threading.get_ident():
+                nested = True
+            else:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """ Hold the lock for writing
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class FileLock():
+    """ Re-entrant fcntl advisory lock on a lock file, shared between
+    processes
+
+    Meant to be taken while holding an RWLock for writing, so only one
+    thread of the process uses it at a time. A shared hold can't be
+    upgraded to an exclusive one.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize the lock on file_path
+        """
+        self.file_path = file_path
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+
+    @contextmanager
+    def hold(self, exclusive: bool = True):
+        """ Hold the lock, exclusively or shared
+        """
+        if self._depth == 0:
+            self._fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive
+                        else fcntl.LOCK_SH)
+            self._exclusive = exclusive
+        elif exclusive and not self._exclusive:
+            raise RuntimeError("can't upgrade a shared file lock")
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+"""
+from typing import TypeVar, List, Tuple
+from os import getenv
+import sqlite3
+import threading
+from models.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """ Storage backend keeping one table per class in a SQLite database
+
+    The database runs in WAL mode, each thread gets its own connection,
+    and declared indexes become SQL indexes, so get/search/count are
+    answered by SQLite instead of scanning Python objects.
+    """
+
+    def __init__(self, db_path: str = None):
+        """ Initialize the backend on DB_SQLITE_PATH (default .db.sqlite3)
+        """
+        self.db_path = db_path or getenv("DB_SQLITE_PATH", ".db.sqlite3")
+        self._local = threading.local()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, cls) -> dict:
+        """ Create the table of cls if needed and return its statements
+        """
+        table = self._tables.get(cls)
+        if table is not None:
+            return table
+        with self._lock:
+            table = self._tables.get(cls)
+            if table is not None:
+                return table
+            name = cls.__name__
+            fields = cls._fields()
+            columns = ", ".join('"{}"'.format(f) for f in fields)
+            conn = self._connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(
+                name, ", ".join(
+                    '"{}" TEXT PRIMARY KEY'.format(f) if f == "id"
+                    else '"{}"'.format(f) for f in fields)))
+            conn.execute('CREATE TABLE IF NOT EXISTS "_versions" '
+                         '(name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO "_versions" VALUES (?, 0)',
+                         (name,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    'CREATE TRIGGER IF NOT EXISTS "{0}_version_{1}" '
+                    'AFTER {1} ON "{0}" BEGIN UPDATE "_versions" '
+                    'SET version = version + 1 WHERE name = \'{0}\'; END'
+                    .format(name, event.lower()))
+            for attr, unique in cls.indexes.items():
+                conn.execute(
+                    'CREATE {}INDEX IF NOT EXISTS "{}_{}" ON "{}" ("{}")'
+                    .format("UNIQUE " if unique else "", name, attr,
+                            name, attr))
+            table = {
+                "fields": fields,
+                "select": 'SELECT {} FROM "{}"'.format(columns, name),
+                "upsert": 'INSERT INTO "{}" ({}) VALUES ({}) '
+                          'ON CONFLICT(id) DO UPDATE SET {}'.format(
+                              name, columns, ", ".join("?" * len(fields)),
+                              ", ".join('"{0}"=excluded."{0}"'.format(f)
+                                        for f in fields if f != "id")),
+                "delete": 'DELETE FROM "{}" WHERE id = ?'.format(name),
+                "count": 'SELECT COUNT(*) FROM "{}"'.format(name),
+                "version": 'SELECT version FROM "_versions" WHERE name = ?',
+                "page": 'SELECT {} FROM "{}" WHERE id > ? '
+                        'ORDER BY id LIMIT ?'.format(columns, name),
+            }
+            self._tables[cls] = table
+        return table
+
+    @staticmethod
+    def _values(obj: TypeVar('Base'), fields: tuple) -> tuple:
+        """ Column values of obj, timestamps as epoch seconds
+        """
+        values = []
+        for field in fields:
+            if field in ("created_at", "updated_at"):
+                values.append(getattr(obj, "_" + field))
+            else:
+                values.append(getattr(obj, field))
+        return tuple(values)
+
+    def load(self, cls):
+        """ Make sure the table of cls exists
+        """
+        self._table(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update obj
+        """
+        table = self._table(obj.__class__)
+        try:
+            self._connection().execute(
+                table["upsert"], self._values(obj, table["fields"]))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e))
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove obj
+        """
+        table = self._table(obj.__class__)
+        self._connection().execute(table["delete"], (obj.id,))
+
+    def count(self, cls) -> int:
+        """ Count the objects of cls
+        """
+        table = self._table(cls)
+        return self._connection().execute(table["count"]).fetchone()[0]
+
+    def get(self, cls, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID, or None
+        """
+        table = self._table(cls)
+        row = self._connection().execute(
+            table["select"] + " WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**dict(row))
+
+    def version(self, cls) -> str:
+        """ Version of the objects of cls, kept by triggers so writes
+        of every process count
+        """
+        table = self._table(cls)
+        row = self._connection().execute(
+            table["version"], (cls.__name__,)).fetchone()
+        return "{:x}".format(row[0])
+
+    def _where(self, cls, filters: dict,
+               prefixes: dict = {}) -> Tuple[str, list]:
+        """ WHERE clause and parameters for equality filters and string
+        prefixes; prefixes become index-friendly range conditions
+        """
+        table = self._table(cls)
+        clauses = []
+        params = []
+        for k in list(filters) + list(prefixes):
+            if k not in table["fields"]:
+                raise AttributeError("'{}' object has no attribute '{}'"
+                                     .format(cls.__name__, k))
+        for k, v in filters.items():
+            if v is None:
+                clauses.append('"{}" IS NULL'.format(k))
+            else:
+                clauses.append('"{}" = ?'.format(k))
+                params.append(v)
+        for k, prefix in prefixes.items():
+            clauses.append('"{0}" >= ? AND "{0}" < ?'.format(k))
+            params += [prefix, prefix + "\U0010ffff"]
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+
+    def search(self, cls,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return the objects of cls with matching attributes
+        """
+        table = self._table(cls)
+        where, params = self._where(cls, attributes)
+        rows = self._connection().execute(table["select"] + where, params)
+        return [cls(**dict(row)) for row in rows]
+
+    def query(self, cls, filters: dict = {}, prefixes: dict = {},
+              sort: str = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Return the objects of cls matching filters and prefixes,
+        sorted by sort, and SQLite's query plan
+        """
+        table = self._table(cls)
+        where, params = self._where(cls, filters, prefixes)
+        sql = table["select"] + where
+        if sort:
+            attr = sort.lstrip('-')
+            if attr not in table["fields"]:
+                raise AttributeError("'{}' object has no attribute '{}'"
+                                     .format(cls.__name__, attr))
+            sql += ' ORDER BY "{}" {}'.format(
+                attr, "DESC" if sort.startswith('-') else "ASC")
+        conn = self._connection()
+        plan = "; ".join(row["detail"] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + sql, params))
+        rows = conn.execute(sql, params)
+        return [cls(**dict(row)) for row in rows], plan
+
+    def page(self, cls, limit: int,
+             after: str = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects of cls ordered by ID, starting
+        after the ID `after`, walking the primary key index
+        """
+        table = self._table(cls)
+        rows = self._connection().execute(
+            table["page"], ("" if after is None else after, limit))
+        return [cls(**dict(row)) for row in rows]
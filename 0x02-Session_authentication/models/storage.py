@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from typing import TypeVar, List, Iterable, Tuple
+from os import getenv
+
+
+def sort_key(attr: str):
+    """ Sort key on attr keeping None values apart (last, or first when
+    descending) so they are never compared with real values
+    """
+    def key(obj):
+        value = getattr(obj, attr)
+        return (value is None, "" if value is None else value)
+    return key
+
+
+class Storage():
+    """ Storage backend interface
+
+    A backend keeps the objects of every Base subclass; Base delegates
+    its persistence and lookup methods to the active backend.
+    """
+
+    def load(self, cls):
+        """ Load (or reload) the objects of cls
+        """
+        raise NotImplementedError
+
+    def save_to_file(self, cls):
+        """ Persist everything of cls kept in memory, if anything
+        """
+
+    def flush(self):
+        """ Write the changes queued by the backend, if any
+        """
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update obj
+        """
+        raise NotImplementedError
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove obj
+        """
+        raise NotImplementedError
+
+    def count(self, cls) -> int:
+        """ Count the objects of cls
+        """
+        raise NotImplementedError
+
+    def all(self, cls) -> Iterable[TypeVar('Base')]:
+        """ Return all objects of cls
+        """
+        return self.search(cls)
+
+    def get(self, cls, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID, or None
+        """
+        raise NotImplementedError
+
+    def search(self, cls,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return the objects of cls with matching attributes
+        """
+        raise NotImplementedError
+
+    def version(self, cls) -> str:
+        """ Opaque version of the objects of cls, which changes whenever
+        one of them is saved or removed
+        """
+        raise NotImplementedError
+
+    def query(self, cls, filters: dict = {}, prefixes: dict = {},
+              sort: str = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Return the objects of cls matching filters (equality) and
+        prefixes (string prefix), sorted by sort (a field name, '-'
+        prefixed for descending), and a description of the plan used
+        """
+        objs = [obj for obj in self.search(cls, filters)
+                if all(isinstance(getattr(obj, k), str) and
+                       getattr(obj, k).startswith(prefix)
+                       for k, prefix in prefixes.items())]
+        plan = "scan"
+        if sort:
+            attr = sort.lstrip('-')
+            objs.sort(key=sort_key(attr), reverse=sort.startswith('-'))
+            plan += ", sort:{}".format(sort)
+        return objs, plan
+
+    def page(self, cls, limit: int,
+             after: str = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects of cls ordered by ID, starting
+        after the ID `after`
+        """
+        objs = sorted(self.search(cls), key=lambda obj: obj.id)
+        if after is not None:
+            objs = [obj for obj in objs if obj.id > after]
+        return objs[:limit]
+
+
+STORAGE_TYPES = {
+    "json": ("models.json_storage", "JSONStorage"),
+    "sqlite": ("models.sqlite_storage", "SQLiteStorage"),
+}
+_storage = None
+
+
+def get_storage() -> Storage:
+    """ Return the backend selected by DB_STORAGE (default: json),
+    importing its module on first use
+    """
+    global _storage
+    if _storage is None:
+        storage_type = getenv("DB_STORAGE", "json")
+        if storage_type not in STORAGE_TYPES:
+            raise ValueError("unknown DB_STORAGE: {}".format(storage_type))
+        module_name, class_name = STORAGE_TYPES[storage_type]
+        module = __import__(module_name, fromlist=[class_name])
+        _storage = getattr(module, class_name)()
+    return _storage
@@ -2,11 +2,15 @@
 """Auth module
 """
 import bcrypt
+import os
+import time
 from db import DB
 from user import User
 from sqlalchemy.orm.exc import NoResultFound
 from uuid import uuid4
 
+DEFAULT_BCRYPT_ROUNDS = 12
+
 
 class Auth:
     """Auth class to interact with the authentication database.
@@ -43,10 +47,15 @@ class Auth:
             return False
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'),
-                                  user.hashed_password)
         except NoResultFound:
             return False
+        if not bcrypt.checkpw(password.encode('utf-8'),
+                              user.hashed_password):
+            return False
+        if _needs_rehash(user.hashed_password):
+            self._db.update_user(user.id,
+                                 hashed_password=_hash_password(password))
+        return True
 
     def create_session(self, email: str) -> str:
         """Creates a session
@@ -109,7 +118,57 @@ def _hash_password(password: str) -> bytes:
     Returns:
         bytes: The salted and hashed password
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(_bcrypt_rounds()))
+
+
+def _bcrypt_rounds() -> int:
+    """Returns the bcrypt cost policy, read from BCRYPT_ROUNDS
+    """
+    try:
+        return int(os.getenv("BCRYPT_ROUNDS", DEFAULT_BCRYPT_ROUNDS))
+    except ValueError:
+        return DEFAULT_BCRYPT_ROUNDS
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """Tells whether a hash was made with a cost other than the policy
+
+    Args:
+        hashed_password (bytes): The stored bcrypt hash
+
+    Returns:
+        bool: True if the hash should be replaced on next login
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    return int(hashed_password.split(b'$')[2]) != _bcrypt_rounds()
+
+
+def calibrate_bcrypt_rounds(target_seconds: float = 0.25,
+                            min_rounds: int = 10,
+                            max_rounds: int = 16) -> int:
+    """Picks the bcrypt cost to hit a target verify latency
+
+    Each extra round doubles the work, so one hash at min_rounds is
+    enough to extrapolate.
+
+    Args:
+        target_seconds (float): The verify latency to stay within
+        min_rounds (int): The lowest cost to consider
+        max_rounds (int): The highest cost to consider
+
+    Returns:
+        int: The cost factor to set as BCRYPT_ROUNDS
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(min_rounds))
+    elapsed = time.perf_counter() - start
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
 
 
 def _generate_uuid() -> str: